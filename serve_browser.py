@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+FormatFlip - Shared Test Browser
+Launches one headless Chromium and keeps it running, so repeated runs of
+test_all_functions.py can connect to it instead of booting a browser each time.
+
+Usage:
+    python3 serve_browser.py [--port 9222]
+    export FF_BROWSER_WS=<endpoint printed below>
+    python3 test_all_functions.py
+
+Python Playwright has no launch_server(), so the browser is exposed over its
+DevTools port and test runs attach with chromium.connect_over_cdp().
+"""
+
+import sys
+import time
+
+from playwright.sync_api import sync_playwright
+
+from test_all_functions import CHROMIUM_ARGS
+
+PORT = int(sys.argv[sys.argv.index("--port") + 1]) if "--port" in sys.argv else 9222
+
+
+def main():
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True, args=[*CHROMIUM_ARGS, f"--remote-debugging-port={PORT}"],
+                                    chromium_sandbox=False)
+        print(f"http://127.0.0.1:{PORT}", flush=True)
+        print("Browser running - press Ctrl+C to stop", file=sys.stderr)
+        try:
+            while browser.is_connected():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            browser.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,104 +7,452 @@ and produces a bug report.
 Usage:
     python3 test_all_functions.py [--live]  # --live tests against formatflip.pages.dev
                                             # default tests against local file://
+
+    Set FF_BROWSER_WS to the endpoint printed by serve_browser.py to reuse a
+    running browser instead of launching one per run.
+
+    Set FORMATFLIP_SCREENSHOTS=always to capture every step (default on-fail
+    captures only failed checks; never disables screenshots).
+
+    python3 test_all_functions.py --shard 1/3   # run one of 3 disjoint slices,
+                                                # writes test_report.shard1.md
+    python3 test_all_functions.py --merge-reports  # combine the shard reports
 """
 
 import sys
 import os
 import time
 import json
+import base64
+import hashlib
+import inspect
+import io
 import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from PIL import Image, ImageDraw
 
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+# numpy/Pillow are imported by the image makers, which only run in the image
+# worker processes on a cache miss, and Playwright by the methods that drive a
+# browser, so --merge-reports and serve_browser.py's import stay light.
+
+try:
+    import orjson  # optional: much faster for large merged shard results
+except ImportError:
+    orjson = None
 
 # --- Configuration ---
 PROJECT_DIR = Path(__file__).parent.resolve()
 SCRATCHPAD = Path("/private/tmp/claude/-Users-sarahokafor/d1dc396f-5317-4746-a225-288cca150cad/scratchpad")
 SCREENSHOT_DIR = SCRATCHPAD / "screenshots"
-REPORT_PATH = SCRATCHPAD / "test_report.md"
+SHARD = (sys.argv[sys.argv.index("--shard") + 1:] or [""])[0] if "--shard" in sys.argv else "1/1"
+try:
+    SHARD_INDEX, SHARD_COUNT = (int(n) for n in SHARD.split("/"))
+except ValueError:
+    SHARD_INDEX = SHARD_COUNT = 0
+if not 1 <= SHARD_INDEX <= SHARD_COUNT:
+    sys.exit(f"usage: --shard i/n with 1 <= i <= n (got {SHARD!r})")
+REPORT_PATH = SCRATCHPAD / ("test_report.md" if SHARD_COUNT == 1 else f"test_report.shard{SHARD_INDEX}.md")
+RESULTS_PATH = REPORT_PATH.with_suffix(".json")
 USE_LIVE = "--live" in sys.argv
-LIVE_URL = sys.argv[sys.argv.index("--live") + 1] if "--live" in sys.argv and len(sys.argv) > sys.argv.index("--live") + 1 else "https://formatflip.pages.dev"
+LIVE_URL = sys.argv[sys.argv.index("--live") + 1] if "--live" in sys.argv and len(sys.argv) > sys.argv.index("--live") + 1 and not sys.argv[sys.argv.index("--live") + 1].startswith("--") else "https://formatflip.pages.dev"
 APP_URL = LIVE_URL if USE_LIVE else f"file://{PROJECT_DIR / 'index.html'}"
+BROWSER_WS = os.environ.get("FF_BROWSER_WS")
+# Page-wide Playwright timeouts (ms), set in new_page(). Green-path actions
+# finish well inside these; waiting 30s on a broken one only hides the bug.
+DEFAULT_TIMEOUT = 3000
+NAVIGATION_TIMEOUT = 10000
+# Step 4 converts every file before its download buttons enable; the one wait
+# allowed well past the default timeout
+CONVERSION_TIMEOUT = 15000
+# always: every labelled step; on-fail: only failed checks; never: none
+SCREENSHOTS = os.environ.get("FORMATFLIP_SCREENSHOTS", "on-fail")
+
+# Headless flags that skip GPU/compositor, extension, sync and background
+# networking work the suite never needs. Image decoding stays on: uploads are
+# decoded through an <img> element before being drawn to the canvas.
+CHROMIUM_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-renderer-backgrounding",
+    "--disable-background-timer-throttling",
+    "--font-render-hinting=none",
+    "--no-sandbox",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-translate",
+    "--mute-audio",
+    "--no-first-run",
+]
+
+# Web font requests answered with an empty body, so no load waits on Google
+# Fonts; text falls back to the system font. Fulfilled rather than aborted
+# so they don't surface as console errors in the report. The app's own files
+# and the CDN/Firebase scripts it runs on are left alone; file:// requests
+# never pass through routing anyway.
+STUBBED_ROUTES = {
+    "https://fonts.googleapis.com/**": "text/css",
+    "https://fonts.gstatic.com/**": "font/woff2",
+}
+
+# Probe helpers injected into every page load, so repeated checks are parsed
+# once by the browser and sent as short `__tf.*()` calls
+FF_TEST_HELPERS_JS = """
+window.__tf = {
+    // Element lookups memoized per page load; re-resolved if the node is detached
+    nodes: {},
+    node(id) {
+        let n = this.nodes[id];
+        if (!n || !n.isConnected) n = this.nodes[id] = document.getElementById(id);
+        return n;
+    },
+    cornerAlpha() {
+        const c = this.node("editCanvas");
+        if (!c) return -1;
+        const ctx = c.getContext("2d", {willReadFrequently: true});
+        return ctx.getImageData(0, 0, 1, 1).data[3]; // alpha of top-left pixel
+    },
+    panelActive(id) {
+        const p = this.node(id);
+        return !!p && (p.classList.contains("active") ||
+               getComputedStyle(p).display !== "none");
+    },
+    shown(id) {
+        const n = this.node(id);
+        return !!n && !n.classList.contains("hidden") &&
+               getComputedStyle(n).display !== "none";
+    },
+    formatSelected(fmt) {
+        const opt = document.querySelector(`.format-option[data-format="${fmt}"]`);
+        return !!opt && opt.classList.contains("selected");
+    },
+    canvasDims(id = "editCanvas") {
+        const c = this.node(id);
+        return c ? {w: c.width, h: c.height} : null;
+    },
+    // Click controls in order and report the result; the app's edit handlers
+    // are synchronous, so the canvas is final when this returns
+    press(...selectors) {
+        for (const sel of selectors) {
+            const el = document.querySelector(sel);
+            if (!el) return {missing: sel, dims: this.canvasDims(), toasts: this.toasts()};
+            el.click();
+        }
+        return {dims: this.canvasDims(), toasts: this.toasts()};
+    },
+    toasts() {
+        return Array.from(document.querySelectorAll(".toast"))
+            .map(t => t.textContent).join("; ");
+    },
+    ffState() {
+        const ff = window.formatFlip;
+        if (!ff) return null;
+        const f = ff.files && ff.files[ff.currentFileIndex];
+        return {
+            historyIdx: ff.historyIndex,
+            historyLen: ff.history.length,
+            fileCount: ff.files.length,
+            currentFileIndex: ff.currentFileIndex,
+            isCropping: ff.isCropping,
+            hasEdited: !!(f && f.editedImageData),
+        };
+    },
+};
+
+// Push canvas state to Python after undo/redo (see __tfReport in new_page).
+// app.js has defined the class but not created window.formatFlip yet.
+document.addEventListener("DOMContentLoaded", () => {
+    if (typeof FormatFlip === "undefined") return;
+    for (const name of ["undo", "redo"]) {
+        const orig = FormatFlip.prototype[name];
+        FormatFlip.prototype[name] = function (...args) {
+            const result = orig.apply(this, args);
+            if (window.__tfReport) {
+                window.__tfReport({cornerAlpha: window.__tf.cornerAlpha(), ...window.__tf.ffState()});
+            }
+            return result;
+        };
+    }
+});
+"""
+
+# Hides the auth modal before app code runs, for pages that skip the Phase 1
+# auth checks. Listener order puts it ahead of app.js's own DOMContentLoaded.
+FF_AUTH_BYPASS_JS = """
+document.addEventListener("DOMContentLoaded", () => {
+    const m = document.getElementById("authModal");
+    if (m) { m.style.display = "none"; m.classList.add("hidden"); }
+    document.body.style.overflow = "";
+});
+"""
 
 # --- Test Image Generation ---
 
-def create_test_images():
-    """Create test images with Pillow for various testing scenarios."""
-    img_dir = SCRATCHPAD / "test_images"
-    img_dir.mkdir(parents=True, exist_ok=True)
+def _png_bytes(img):
+    """Encode an image as PNG in memory."""
+    buf = io.BytesIO()
+    img.save(buf, "PNG", compress_level=1)
+    return buf.getvalue()
 
-    paths = {}
 
-    # 1. White background with black shapes (for BG removal)
-    img = Image.new("RGBA", (200, 200), (255, 255, 255, 255))
-    draw = ImageDraw.Draw(img)
-    draw.rectangle([60, 60, 140, 140], fill=(0, 0, 0, 255))
-    draw.ellipse([80, 30, 120, 55], fill=(255, 0, 0, 255))
-    p = img_dir / "test_white_bg.png"
-    img.save(p)
-    paths["white_bg"] = str(p)
+def _file_payload(name, data):
+    """Playwright-style file payload, so uploads skip a disk read."""
+    return {"name": name, "mimeType": "image/png", "buffer": data}
 
-    # 2. Blue background with green shape (for color-pick removal)
-    img = Image.new("RGBA", (200, 200), (0, 100, 200, 255))
-    draw = ImageDraw.Draw(img)
-    draw.rectangle([50, 50, 150, 150], fill=(0, 200, 50, 255))
-    p = img_dir / "test_color_bg.png"
-    img.save(p)
-    paths["color_bg"] = str(p)
 
-    # 3. Large image (for resize/performance)
-    img = Image.new("RGBA", (2000, 1500), (220, 220, 220, 255))
-    draw = ImageDraw.Draw(img)
-    for i in range(0, 2000, 100):
-        draw.line([(i, 0), (i, 1500)], fill=(180, 180, 180, 255), width=2)
-    for i in range(0, 1500, 100):
-        draw.line([(0, i), (2000, i)], fill=(180, 180, 180, 255), width=2)
-    draw.rectangle([400, 300, 1600, 1200], fill=(100, 150, 200, 255))
-    p = img_dir / "test_large.png"
-    img.save(p)
-    paths["large"] = str(p)
-
-    # 4. Small image (for ICO edge case)
-    img = Image.new("RGBA", (16, 16), (255, 0, 0, 255))
+def _make_white_bg():
+    """White background with black shapes (for BG removal)."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    arr = np.full((200, 200, 4), (255, 255, 255, 255), dtype=np.uint8)
+    arr[60:141, 60:141] = (0, 0, 0, 255)
+    img = Image.fromarray(arr)
+    # Ellipses can't be expressed as slices; leave them to ImageDraw
     draw = ImageDraw.Draw(img)
-    draw.rectangle([4, 4, 12, 12], fill=(0, 0, 255, 255))
-    p = img_dir / "test_small.png"
-    img.save(p)
-    paths["small"] = str(p)
-
-    # 5. Second image for multi-file tests
+    draw.ellipse([80, 30, 120, 55], fill=(255, 0, 0, 255))
+    return "white_bg", "test_white_bg.png", _png_bytes(img)
+
+
+def _make_color_bg():
+    """Blue background with green shape (for color-pick removal)."""
+    import numpy as np
+    from PIL import Image
+    arr = np.full((200, 200, 4), (0, 100, 200, 255), dtype=np.uint8)
+    arr[50:151, 50:151] = (0, 200, 50, 255)
+    img = Image.fromarray(arr)
+    return "color_bg", "test_color_bg.png", _png_bytes(img)
+
+
+def _make_large():
+    """Large image (for resize/performance)."""
+    import numpy as np
+    from PIL import Image
+    # Built as an array: 2px grid lines every 100px, then the inner rectangle
+    arr = np.full((1500, 2000, 4), (220, 220, 220, 255), dtype=np.uint8)
+    for offset in (0, 1):
+        arr[:, offset::100] = (180, 180, 180, 255)
+        arr[offset::100, :] = (180, 180, 180, 255)
+    arr[300:1201, 400:1601] = (100, 150, 200, 255)
+    img = Image.fromarray(arr)
+    return "large", "test_large.png", _png_bytes(img)
+
+
+def _make_small():
+    """Small image (for ICO edge case)."""
+    import numpy as np
+    from PIL import Image
+    arr = np.full((16, 16, 4), (255, 0, 0, 255), dtype=np.uint8)
+    arr[4:13, 4:13] = (0, 0, 255, 255)
+    img = Image.fromarray(arr)
+    return "small", "test_small.png", _png_bytes(img)
+
+
+def _make_second():
+    """Second image for multi-file tests."""
+    from PIL import Image, ImageDraw
     img = Image.new("RGBA", (150, 150), (255, 255, 0, 255))
     draw = ImageDraw.Draw(img)
     draw.ellipse([20, 20, 130, 130], fill=(200, 0, 200, 255))
-    p = img_dir / "test_second.png"
-    img.save(p)
-    paths["second"] = str(p)
+    return "second", "test_second.png", _png_bytes(img)
+
+
+IMAGE_MAKERS = [_make_white_bg, _make_color_bg, _make_large, _make_small, _make_second]
+
+
+def _images_signature():
+    """Hash of the code that draws the fixtures; changes whenever an image would."""
+    source = "".join(inspect.getsource(f) for f in [start_test_images, _png_bytes, *IMAGE_MAKERS])
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def _write_atomic(path, data):
+    """Write bytes via a per-process temp file, so concurrent shards sharing
+    the cache directory never see a partially written file."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
 
-    return paths
+
+def start_test_images():
+    """Start creating test images with Pillow for various testing scenarios.
+
+    Returns a function that yields Playwright file payloads keyed by image
+    name. The images are independent, so they are built in parallel worker
+    processes (PNG encoding is CPU-bound) while the caller gets on with other
+    setup. Copies are written to disk for inspection, and because the images
+    are deterministic they are reused while the drawing code is unchanged.
+    """
+    img_dir = SCRATCHPAD / "test_images"
+    img_dir.mkdir(parents=True, exist_ok=True)
+
+    # manifest.json records the drawing-code signature and the files it produced
+    manifest_path = img_dir / "manifest.json"
+    sig = _images_signature()
+    try:
+        cached = json.loads(manifest_path.read_text())
+        if cached["sig"] == sig:
+            images = {key: _file_payload(name, (img_dir / name).read_bytes())
+                      for key, name in cached["files"].items()}
+            return lambda: images
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Workers start here, before any Playwright threads exist. Where the start
+    # method is spawn (macOS, Windows) they re-import this module, so the
+    # makers must stay module-level functions
+    pool = ProcessPoolExecutor(max_workers=len(IMAGE_MAKERS))
+    futures = [pool.submit(make) for make in IMAGE_MAKERS]
+
+    def collect():
+        images = {}
+        files = {}
+        with pool:
+            for future in futures:
+                key, name, data = future.result()
+                _write_atomic(img_dir / name, data)
+                images[key] = _file_payload(name, data)
+                files[key] = name
+        # Manifest last: it only ever names files that are already complete
+        _write_atomic(manifest_path, json.dumps({"sig": sig, "files": files}, indent=2).encode())
+        return images
+
+    return collect
 
 
 # --- Test Runner ---
 
+def dump_json(obj):
+    """Serialize compactly to bytes, using orjson when it is installed."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def launch_browser(p):
+    """Attach to the serve_browser.py browser if FF_BROWSER_WS is set, else launch."""
+    if BROWSER_WS:
+        return p.chromium.connect_over_cdp(BROWSER_WS)
+    return p.chromium.launch(headless=True, args=CHROMIUM_ARGS, chromium_sandbox=False)
+
+
+# Phase groups that don't depend on the main page's state; each runs on its own
+# browser in parallel with the main sequence (phases 1-2, 7-8).
+# (screenshot prefix, upload an image first?, [(method, image keys), ...])
+PHASE_GROUPS = [
+    ("bg", True, [("test_phase3_bg_removal", ())]),
+    ("crop", True, [("test_phase4_crop", ())]),
+    ("rotate", True, [("test_phase5_rotate", ())]),
+    ("resize", True, [("test_phase6_resize", ())]),
+    # These start from step 1 themselves via reset_app(): the first phase on a
+    # fresh page loads the app, later ones in the group reuse it via startOver()
+    ("multi", False, [("test_phase9_multifile", ("white_bg", "second"))]),
+    ("edge", False, [("test_phase10_edge_cases", ("white_bg",)), ("test_phase11_css", ("white_bg",)),
+                     ("test_known_bugs", ())]),
+]
+MAX_WORKERS = 4
+
+# Non-free crop presets from #cropToolPanel, checked together for BUG-1
+CROP_RATIOS = ["1:1", "4:3", "16:9", "3:2", "a4"]
+
+# Probe-only checks, run a table at a time by run_checks() in one evaluate.
+# (test id, name, JS expression, passed(value), detail(value, passed))
+UPLOAD_CHECKS = [
+    (5, "Canvas dimensions", "__tf.canvasDims()",
+     lambda d: d["w"] > 0,
+     lambda d, ok: f"{d['w']}x{d['h']}" if ok else f"Got: {d}"),
+    (6, "File list renders", 'document.querySelectorAll(".file-item").length',
+     lambda n: n >= 1,
+     lambda n, ok: f"{n} file(s) shown"),
+]
+UNDO_HANDLER_CHECKS = [
+    # Need an image loaded to test undo; just verify the keyboard handler exists
+    (51, "Keyboard undo (Ctrl+Z) handler exists", 'typeof window.formatFlip?.undo === "function"',
+     lambda has: has is True,
+     lambda has, ok: "app.undo() function exists"),
+]
+KNOWN_BUG_CHECKS = [
+    # BUG-2: #editCanvas CSS cursor (was hardcoded crosshair, now fixed to default)
+    ("BUG-2", "CSS cursor on #editCanvas is default (was crosshair)", """(() => {
+        const c = __tf.node("editCanvas");
+        if (!c) return {computed: "not found", inline: ""};
+        const savedCursor = c.style.cursor;
+        c.style.cursor = "";
+        const computed = getComputedStyle(c).cursor;
+        c.style.cursor = savedCursor;
+        return {computed: computed, inline: savedCursor};
+    })()""",
+     lambda check: check["computed"] == "default",
+     lambda check, ok: f"Computed (with inline cleared): {check}. " +
+                       ("FIXED: CSS now sets cursor:default." if ok else
+                        "STILL BROKEN: CSS still sets cursor:crosshair.")),
+    # BUG-3: downloadAllBtn calls downloadAsZip() (was calling downloadAll())
+    ("BUG-3", "downloadAsZip() is reachable via UI", """({
+        downloadAllExists: __tf.node("downloadAllBtn") !== null,
+        downloadAsZipExists: typeof window.formatFlip?.downloadAsZip === "function",
+        btnText: __tf.node("downloadAllBtn")?.textContent.trim() || ""
+    })""",
+     lambda check: check["downloadAllExists"] and check["downloadAsZipExists"],
+     lambda check, ok: f"Check: {check}. " +
+                       ("FIXED: downloadAllBtn calls downloadAsZip()." if ok else
+                        "STILL BROKEN: downloadAsZip() unreachable.")),
+]
+
+# Units that --shard deals out: the main sequence plus each phase group
+SHARD_UNITS = ["main"] + [prefix for prefix, _, _ in PHASE_GROUPS]
+
 class FormatFlipTestRunner:
-    def __init__(self):
+    def __init__(self, screenshot_prefix="", io_pool=None):
         self.results = []
         self.console_errors = []
         self.console_warnings = []
         self.screenshots = []
+        self.screenshot_aliases = {}  # deduped screenshot -> file holding it
         self.test_num = 0
         self.page = None
         self.browser = None
-
-    def screenshot(self, label):
-        """Capture a numbered screenshot."""
+        self.screenshot_prefix = screenshot_prefix
+        self._loc = {}
+        self._reports = []
+        # Screenshot files are written here off the test thread; see run()
+        self._io_pool = io_pool
+        # sha256 of each captured frame -> file it was saved as
+        self._screenshot_hashes = {}
+
+    def screenshot(self, label, canonical=False, force=False):
+        """Capture a numbered screenshot, subject to FORMATFLIP_SCREENSHOTS.
+
+        Screenshots are JPEG by default; pass canonical=True for the
+        before/after shots where PNG fidelity matters in the bug report.
+        Step shots are only taken in "always" mode; force=True (failures)
+        takes one unless screenshots are off. The file is written by the
+        I/O pool when there is one. A frame identical to an earlier one is not
+        written again; the report points at the first file instead.
+        """
+        # Numbering advances regardless, so names line up across modes
         self.test_num_ss = getattr(self, "test_num_ss", 0) + 1
-        name = f"{self.test_num_ss:02d}_{label}.png"
+        if SCREENSHOTS == "never" or (SCREENSHOTS != "always" and not force):
+            return None
+        name = f"{self.screenshot_prefix}{self.test_num_ss:02d}_{label}.png"
         path = SCREENSHOT_DIR / name
-        self.page.screenshot(path=str(path))
-        self.screenshots.append(name)
+        if canonical:
+            data = self.page.screenshot(animations="disabled")
+        else:
+            path = path.with_suffix(".jpg")
+            data = self.page.screenshot(type="jpeg", quality=70,
+                                        animations="disabled", caret="initial")
+        digest = hashlib.sha256(data).hexdigest()
+        first = self._screenshot_hashes.get(digest)
+        if first:
+            self.screenshots.append(path.name)
+            self.screenshot_aliases[path.name] = first.name
+            return str(first)
+        self._screenshot_hashes[digest] = path
+        if self._io_pool:
+            self._io_pool.submit(path.write_bytes, data)
+        else:
+            path.write_bytes(data)
+        self.screenshots.append(path.name)
         return str(path)
 
     def record(self, test_id, name, passed, detail=""):
@@ -118,6 +466,12 @@ class FormatFlipTestRunner:
         })
         symbol = "PASS" if passed else "FAIL"
         print(f"  [{symbol}] #{test_id}: {name}" + (f" - {detail}" if detail else ""))
+        if not passed and self.page:
+            try:
+                self.screenshot("FAIL_" + "".join(c if c.isalnum() else "_" for c in str(test_id)),
+                                force=True)
+            except Exception:
+                pass  # page may already be gone (fatal errors)
 
     def skip(self, test_id, name, reason=""):
         self.results.append({
@@ -128,28 +482,101 @@ class FormatFlipTestRunner:
         })
         print(f"  [SKIP] #{test_id}: {name}" + (f" - {reason}" if reason else ""))
 
-    def wait(self, ms=500):
-        """Short wait for UI to settle."""
-        time.sleep(ms / 1000)
+    def loc(self, selector):
+        """Return a cached Locator for the first element matching selector."""
+        if selector not in self._loc:
+            self._loc[selector] = self.page.locator(selector).first
+        return self._loc[selector]
 
-    def safe_click(self, selector, timeout=5000):
-        """Click an element, return True if successful."""
+    def wait_ff(self, cond_js, timeout=None):
+        """Wait until a JS condition holds, return False if it never does."""
         try:
-            self.page.locator(selector).first.click(timeout=timeout)
+            self.page.wait_for_function(f"() => {cond_js}", timeout=timeout)
             return True
         except Exception:
             return False
 
-    def element_visible(self, selector, timeout=3000):
+    def wait_panel(self, panel_id, timeout=2000):
+        """Wait for a tool panel or step to become active; False if it never does."""
+        return self.wait_ff(f'__tf.panelActive("{panel_id}")', timeout=timeout)
+
+    def wait_history(self, before, timeout=2000):
+        """Wait for an edit to push a new history entry past index `before`.
+
+        `before` comes from eval_js; if that read failed (None, or a JS_ERROR
+        string) there is nothing to compare against, so don't wait.
+        """
+        if not isinstance(before, int):
+            return False
+        return self.wait_ff(f"window.formatFlip.historyIndex > {before}", timeout=timeout)
+
+    def run_checks(self, checks):
+        """Evaluate a table of probe-only checks in one call and record each."""
+        values = self.snapshot(",\n".join(f"c{i}: {probe}" for i, (_, _, probe, _, _) in enumerate(checks)))
+        for i, (test_id, name, _, passed, detail) in enumerate(checks):
+            value = values.get(f"c{i}", values.get("js_error"))
+            try:
+                ok = bool(passed(value))
+            except (TypeError, KeyError):  # missing/JS-error value
+                ok = False
+            self.record(test_id, name, ok, detail(value, ok))
+
+    def press(self, *selectors):
+        """Click controls from page JS in one call; returns {dims, toasts}."""
+        try:
+            return self.page.evaluate("(sels) => __tf.press(...sels)", list(selectors))
+        except Exception as e:
+            return {"js_error": f"JS_ERROR: {e}"}
+
+    def click_edit(self, selector):
+        """Click a control that edits the canvas and wait for it to land in history."""
+        before = self.eval_js('window.formatFlip.historyIndex')
+        clicked = self.safe_click(selector)
+        if clicked:
+            self.wait_history(before)
+        return clicked
+
+    def select_tab(self, category):
+        """Click a format category tab and wait for it to become active."""
+        self.safe_click(f'.format-tab[data-category="{category}"]')
+        return self.wait_ff(f'document.querySelector(\'.format-tab[data-category="{category}"]\')'
+                            f'?.classList.contains("active")', timeout=1000)
+
+    def select_format(self, fmt):
+        """Click a format option and wait for it to become the selected one."""
+        self.safe_click(f'.format-option[data-format="{fmt}"]')
+        return self.wait_ff(f'__tf.formatSelected("{fmt}")', timeout=1000)
+
+    def next_report(self, timeout=2000):
+        """Return the next state report pushed via __tfReport, or {} on timeout."""
+        deadline = time.monotonic() + timeout / 1000
+        while not self._reports and time.monotonic() < deadline:
+            # The sync API only dispatches binding calls inside a Playwright call
+            self.page.wait_for_timeout(10)
+        return self._reports.pop(0) if self._reports else {}
+
+    def safe_click(self, selector, timeout=None):
+        """Click an element, return True if successful.
+
+        Relies on locator.click()'s actionability wait; callers follow up with
+        a wait_ff() predicate when the click should change app state.
+        """
+        try:
+            self.loc(selector).click(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def element_visible(self, selector):
         """Check if element is visible."""
         try:
-            return self.page.locator(selector).first.is_visible(timeout=timeout)
+            return self.loc(selector).is_visible()
         except Exception:
             return False
 
     def element_exists(self, selector):
         """Check if element exists in DOM."""
-        return self.page.locator(selector).count() > 0
+        return self.loc(selector).count() > 0
 
     def eval_js(self, js):
         """Evaluate JS in page context, return result."""
@@ -158,20 +585,136 @@ class FormatFlipTestRunner:
         except Exception as e:
             return f"JS_ERROR: {e}"
 
+    def _rewind_history(self):
+        """Undo back to the first history entry in a single round-trip."""
+        self.eval_js('''() => {
+            const ff = window.formatFlip;
+            if (!ff) return;
+            while (ff.historyIndex > 0) ff.undo();
+        }''')
+
+    def snapshot(self, js_object_expr):
+        """Evaluate several JS expressions in one round-trip, return a dict.
+
+        `js_object_expr` is the body of an object literal, e.g.
+        'w: c.width, h: c.height'.
+        """
+        try:
+            return self.page.evaluate(f"() => ({{{js_object_expr}}})")
+        except Exception as e:
+            return {"js_error": f"JS_ERROR: {e}"}
+
+    def new_page(self, bypass_auth=False, storage_state=None):
+        """Open a page in a fresh context with probe helpers and console capture.
+
+        With bypass_auth the auth modal is hidden on every load of the page.
+        storage_state seeds the context's cookies and localStorage, e.g. from
+        the main page after Phase 1 in --live mode. Any previous page's
+        context is closed.
+        """
+        if self.page:
+            self.page.context.close()
+        context = self.browser.new_context(
+            viewport={"width": 1280, "height": 900},
+            accept_downloads=True,
+            storage_state=storage_state,
+        )
+        for pattern, content_type in STUBBED_ROUTES.items():
+            # Keyword-only: Playwright passes (route, request) to a handler with
+            # two positional parameters, which would clobber a defaulted ct
+            context.route(pattern, lambda route, *, ct=content_type: route.fulfill(body="", content_type=ct))
+        self.page = context.new_page()
+        self.page.set_default_timeout(DEFAULT_TIMEOUT)
+        self.page.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
+        self.page.expose_binding("__tfReport", lambda source, payload: self._reports.append(payload))
+        self.page.add_init_script(script=FF_TEST_HELPERS_JS)
+        if bypass_auth:
+            self.page.add_init_script(script=FF_AUTH_BYPASS_JS)
+        self._loc = {}
+
+        # Capture console errors
+        console_lists = {"error": self.console_errors, "warning": self.console_warnings}
+
+        def on_console(msg):
+            target = console_lists.get(msg.type)
+            if target is not None:
+                target.append(f"[{msg.type}] {msg.text}")
+
+        self.page.on("console", on_console)
+
+        # Capture page errors
+        self.page.on("pageerror", lambda exc: (
+            self.console_errors.append(f"[PAGE ERROR] {exc.message}")
+        ))
+
+    def load_app(self):
+        """Navigate to the app and wait until it is constructed and loaded."""
+        self.page.goto(APP_URL, wait_until="domcontentloaded")
+        # The load event waits on the CDN scripts, so it gets the navigation budget
+        self.page.wait_for_function("() => window.formatFlip && document.readyState === 'complete'",
+                                    timeout=NAVIGATION_TIMEOUT)
+        self._loc = {}
+
+    def reset_app(self):
+        """Return the app to an empty step 1, reloading only if it isn't loaded yet."""
+        reset = self.eval_js('''() => {
+            const ff = window.formatFlip;
+            if (!ff || !ff.startOver) return false;
+            ff.startOver();
+            return true;
+        }''')
+        if reset is not True:
+            self.load_app()
+            return
+        self.wait_ff('__tf.panelActive("step1") && window.formatFlip.files.length === 0')
+
+    def open_app(self, image):
+        """Load the app and upload an image, without recording."""
+        self.load_app()
+        self.upload(image)
+
+    def upload(self, images, timeout=None):
+        """Hand files to #fileInput from page JS and wait for step 2.
+
+        Builds File objects in the page and fires the input's change event,
+        skipping Playwright's file-chooser upload plumbing.
+        """
+        if isinstance(images, dict):
+            images = [images]
+        self.page.evaluate('''(files) => {
+            const dt = new DataTransfer();
+            for (const f of files) {
+                const bytes = Uint8Array.from(atob(f.b64), c => c.charCodeAt(0));
+                dt.items.add(new File([bytes], f.name, {type: f.mimeType}));
+            }
+            const input = __tf.node("fileInput");
+            input.files = dt.files;
+            input.dispatchEvent(new Event("change", {bubbles: true}));
+        }''', [{"name": i["name"], "mimeType": i["mimeType"],
+               "b64": base64.b64encode(i["buffer"]).decode()} for i in images])
+        return self.wait_ff(f'__tf.panelActive("step2") && window.formatFlip.files.length >= {len(images)}',
+                            timeout=timeout)
+
     # --- Phase 1: Auth & App Load ---
 
     def test_phase1_load(self):
         print("\n--- Phase 1: Auth & App Load ---")
 
+        # Locators are per-page; start with a fresh cache
+        self._loc = {}
+
         # Test 1: Page loads
         try:
-            self.page.goto(APP_URL, wait_until="domcontentloaded", timeout=30000)
-            self.page.wait_for_load_state("networkidle", timeout=15000)
+            self.page.goto(APP_URL, wait_until="domcontentloaded")
+            # Wait for app markup rather than "networkidle", which pads every
+            # load with a quiet window and can stall on analytics beacons
+            self.page.wait_for_selector(".app-container, #step1, #authModal",
+                                        state="attached", timeout=NAVIGATION_TIMEOUT)
             title = self.page.title()
             has_title = "FormatFlip" in title or "Format" in title.lower()
             # For file:// URLs the title comes from the HTML
             if not has_title:
-                has_title = self.page.locator("h1").first.text_content(timeout=3000) is not None
+                has_title = self.loc("h1").text_content() is not None
             self.record(1, "Page loads", True, f"Title: {title}")
         except Exception as e:
             self.record(1, "Page loads", False, str(e))
@@ -192,7 +735,7 @@ class FormatFlipTestRunner:
 
         # Test 3: Auth bypass
         self.page.evaluate('''() => {
-            const modal = document.getElementById("authModal");
+            const modal = __tf.node("authModal");
             if (modal) {
                 modal.style.display = "none";
                 modal.classList.add("hidden");
@@ -202,7 +745,7 @@ class FormatFlipTestRunner:
             const app = document.querySelector(".app-container");
             if (app) app.style.display = "";
         }''')
-        self.wait(500)
+        self.wait_ff('!!window.formatFlip')
 
         app_visible = self.element_visible(".app-container") or self.element_visible("#step1")
         self.record(3, "Auth bypass works", app_visible,
@@ -212,21 +755,15 @@ class FormatFlipTestRunner:
 
     # --- Phase 2: File Upload ---
 
-    def test_phase2_upload(self, image_path):
+    def test_phase2_upload(self, image):
         print("\n--- Phase 2: File Upload ---")
 
         # Test 4: Upload single image
         try:
-            file_input = self.page.locator("#fileInput")
-            file_input.set_input_files(image_path)
-            self.wait(1500)
+            self.upload(image)
 
             # Check if step 2 became active
-            step2_active = self.eval_js('''() => {
-                const s2 = document.getElementById("step2");
-                return s2 && (s2.classList.contains("active") ||
-                       getComputedStyle(s2).display !== "none");
-            }''')
+            step2_active = self.eval_js('__tf.panelActive("step2")')
             self.record(4, "Upload single image", step2_active,
                         "Step 2 active" if step2_active else "Step 2 not active")
             self.screenshot("03_uploaded")
@@ -234,24 +771,8 @@ class FormatFlipTestRunner:
             self.record(4, "Upload single image", False, str(e))
             return False
 
-        # Test 5: Canvas dimensions
-        dims = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
-        if dims and isinstance(dims, dict) and dims.get("w", 0) > 0:
-            self.record(5, "Canvas dimensions", True,
-                        f"{dims['w']}x{dims['h']}")
-        else:
-            self.record(5, "Canvas dimensions", False, f"Got: {dims}")
-
-        # Test 6: File list renders
-        file_count = self.eval_js('''() => {
-            const items = document.querySelectorAll(".file-item");
-            return items.length;
-        }''')
-        self.record(6, "File list renders", file_count >= 1,
-                    f"{file_count} file(s) shown")
+        # Tests 5-6: Canvas dimensions, file list
+        self.run_checks(UPLOAD_CHECKS)
 
         return True
 
@@ -262,91 +783,65 @@ class FormatFlipTestRunner:
 
         # Test 7: BG panel opens
         clicked = self.safe_click('[data-tool="background"]')
-        self.wait(500)
-        panel_active = self.eval_js('''() => {
-            const p = document.getElementById("bgToolPanel");
-            return p && (p.classList.contains("active") ||
-                   getComputedStyle(p).display !== "none");
-        }''')
+        panel_active = self.wait_panel("bgToolPanel")
         self.record(7, "BG panel opens", panel_active,
                     "Panel active" if panel_active else "Panel not active")
         self.screenshot("04_bg_panel")
 
         # Test 8: Auto-remove white BG
         clicked = self.safe_click("#autoRemoveWhiteBtn")
-        self.wait(1500)
-
-        # Check for toast message
-        toast_text = self.eval_js('''() => {
-            const toasts = document.querySelectorAll(".toast");
-            return Array.from(toasts).map(t => t.textContent).join("; ");
-        }''')
+        self.wait_ff("document.querySelector('.toast') !== null")
+
+        # Toast, transparency and undo/redo buttons in one round-trip
+        state = self.snapshot('''
+            toasts: __tf.toasts(),
+            cornerAlpha: __tf.cornerAlpha(),
+            undoBtn: __tf.node("undoBtn") !== null,
+            redoBtn: __tf.node("redoBtn") !== null
+        ''')
+        toast_text = state.get("toasts", state.get("js_error"))
         has_removed = "Removed" in str(toast_text) or "removed" in str(toast_text)
         no_errors = "error" not in str(toast_text).lower() or "Removed" in str(toast_text)
         self.record(8, "Auto-remove white BG", clicked and no_errors,
                     f"Toast: {toast_text}")
-        self.screenshot("05_bg_removed")
+        self.screenshot("05_bg_removed", canonical=True)
 
         # Test 9: Canvas has transparency (corner pixel alpha = 0)
-        corner_alpha = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            if (!c) return -1;
-            const ctx = c.getContext("2d", {willReadFrequently: true});
-            const d = ctx.getImageData(0, 0, 1, 1);
-            return d.data[3]; // alpha channel of top-left pixel
-        }''')
+        corner_alpha = state.get("cornerAlpha")
         self.record(9, "Canvas has transparency",
                     isinstance(corner_alpha, (int, float)) and corner_alpha == 0,
                     f"Corner alpha: {corner_alpha}")
 
         # Check if undoBtn/redoBtn exist (was BUG-4, now fixed)
-        undo_btn_exists = self.element_exists("#undoBtn")
-        redo_btn_exists = self.element_exists("#redoBtn")
+        undo_btn_exists = state.get("undoBtn", False)
+        redo_btn_exists = state.get("redoBtn", False)
         self.record("BUG-4", "undoBtn and redoBtn exist in HTML",
                     undo_btn_exists and redo_btn_exists,
                     f"undoBtn: {undo_btn_exists}, redoBtn: {redo_btn_exists}")
 
         # Test 10: Undo restores BG (click button)
+        # The page pushes {cornerAlpha, ...ffState} after undo/redo; no polling
+        self._reports.clear()
         self.safe_click("#undoBtn")
-        self.wait(800)
-        corner_alpha_after_undo = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            if (!c) return -1;
-            const ctx = c.getContext("2d", {willReadFrequently: true});
-            const d = ctx.getImageData(0, 0, 1, 1);
-            return d.data[3];
-        }''')
-        history_info = self.eval_js('''() => {
-            const ff = window.formatFlip;
-            if (!ff) return "formatFlip not found";
-            return {idx: ff.historyIndex, len: ff.history.length};
-        }''')
+        state = self.next_report()
+        corner_alpha_after_undo = state.get("cornerAlpha")
+        history_info = {"idx": state.get("historyIdx"), "len": state.get("historyLen")}
         self.record(10, "Undo restores BG (Ctrl+Z)",
                     isinstance(corner_alpha_after_undo, (int, float)) and corner_alpha_after_undo == 255,
                     f"Corner alpha after undo: {corner_alpha_after_undo}, history: {history_info}")
 
         # Test 11: Redo re-removes BG (click button)
+        self._reports.clear()
         self.safe_click("#redoBtn")
-        self.wait(500)
-        corner_alpha_after_redo = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            if (!c) return -1;
-            const ctx = c.getContext("2d", {willReadFrequently: true});
-            const d = ctx.getImageData(0, 0, 1, 1);
-            return d.data[3];
-        }''')
+        state = self.next_report()
+        corner_alpha_after_redo = state.get("cornerAlpha")
         self.record(11, "Redo re-removes BG (Ctrl+Shift+Z)",
                     isinstance(corner_alpha_after_redo, (int, float)) and corner_alpha_after_redo == 0,
                     f"Corner alpha after redo: {corner_alpha_after_redo}")
         self.screenshot("06_after_undo_redo")
 
         # Test 12: editedImageData stored
-        has_edited = self.eval_js('''() => {
-            const ff = window.formatFlip;
-            if (!ff) return "formatFlip not found";
-            const f = ff.files && ff.files[ff.currentFileIndex];
-            return f && f.editedImageData ? true : false;
-        }''')
+        has_edited = state.get("hasEdited", "no report")
         self.record(12, "editedImageData stored",
                     has_edited is True,
                     f"editedImageData: {has_edited}")
@@ -354,11 +849,15 @@ class FormatFlipTestRunner:
         # Test 13: Manual color pick mode
         # Re-open BG panel since it may have closed
         self.safe_click('[data-tool="background"]')
-        self.wait(300)
+        self.wait_panel("bgToolPanel")
         clicked = self.safe_click("#selectColorBtn")
-        self.wait(500)
-        canvas_mode = self.eval_js('document.getElementById("editCanvas")?.dataset?.mode || ""')
-        canvas_cursor = self.eval_js('document.getElementById("editCanvas")?.style?.cursor || ""')
+        self.wait_ff('__tf.node("editCanvas")?.dataset?.mode === "removeBg"', timeout=1000)
+        state = self.snapshot('''
+            canvasMode: __tf.node("editCanvas")?.dataset?.mode || "",
+            canvasCursor: __tf.node("editCanvas")?.style?.cursor || ""
+        ''')
+        canvas_mode = state.get("canvasMode", "")
+        canvas_cursor = state.get("canvasCursor", "")
         self.record(13, "Manual color pick mode",
                     canvas_mode == "removeBg",
                     f"mode={canvas_mode}, cursor={canvas_cursor}")
@@ -366,19 +865,17 @@ class FormatFlipTestRunner:
 
         # Test 14: Click canvas to remove color (click center area)
         try:
-            canvas = self.page.locator("#editCanvas")
+            canvas = self.loc("#editCanvas")
             box = canvas.bounding_box()
             if box:
                 # Click center of canvas
+                idx_before = self.eval_js('window.formatFlip.historyIndex')
                 self.page.mouse.click(
                     box["x"] + box["width"] / 2,
                     box["y"] + box["height"] / 2
                 )
-                self.wait(1000)
-                toast_text2 = self.eval_js('''() => {
-                    const toasts = document.querySelectorAll(".toast");
-                    return Array.from(toasts).map(t => t.textContent).join("; ");
-                }''')
+                self.wait_history(idx_before)
+                toast_text2 = self.eval_js('__tf.toasts()')
                 self.record(14, "Click canvas to remove color", True,
                             f"Toast: {toast_text2}")
             else:
@@ -387,11 +884,8 @@ class FormatFlipTestRunner:
             self.record(14, "Click canvas to remove color", False, str(e))
         self.screenshot("08_color_removed")
 
-        # Reset: undo back to clean state for subsequent tests (via keyboard)
-        self.page.keyboard.press("Control+z")
-        self.wait(200)
-        self.page.keyboard.press("Control+z")
-        self.wait(200)
+        # Reset: undo back to clean state for subsequent tests
+        self._rewind_history()
 
     # --- Phase 4: Crop Tool ---
 
@@ -399,26 +893,18 @@ class FormatFlipTestRunner:
         print("\n--- Phase 4: Crop Tool ---")
 
         # Get original dimensions
-        orig_dims = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        orig_dims = self.eval_js('__tf.canvasDims()')
 
         # Test 15: Crop panel opens
         self.safe_click('[data-tool="crop"]')
-        self.wait(500)
-        panel_active = self.eval_js('''() => {
-            const p = document.getElementById("cropToolPanel");
-            return p && (p.classList.contains("active") ||
-                   getComputedStyle(p).display !== "none");
-        }''')
+        panel_active = self.wait_panel("cropToolPanel")
         self.record(15, "Crop panel opens", panel_active)
         self.screenshot("09_crop_panel")
 
         # Test 16: Free crop preset
         try:
             self.safe_click('.preset-btn[data-ratio="free"]')
-            self.wait(500)
+            self.wait_ff('window.formatFlip.isCropping === true', timeout=1000)
             is_cropping = self.eval_js('''() => {
                 const ff = window.formatFlip;
                 return ff ? ff.isCropping : false;
@@ -431,11 +917,8 @@ class FormatFlipTestRunner:
 
         # Test 17: Apply crop
         apply_clicked = self.safe_click("#applyCropBtn")
-        self.wait(500)
-        new_dims = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        self.wait_ff('window.formatFlip.isCropping === false', timeout=1000)
+        new_dims = self.eval_js('__tf.canvasDims()')
         dims_changed = (new_dims and orig_dims and
                         (new_dims["w"] != orig_dims["w"] or new_dims["h"] != orig_dims["h"]))
         self.record(17, "Apply crop", dims_changed,
@@ -443,16 +926,15 @@ class FormatFlipTestRunner:
         self.screenshot("11_cropped")
 
         # Undo crop to restore for next tests
-        self.page.keyboard.press("Control+z")
-        self.wait(300)
+        self._rewind_history()
 
         # Test 18: Cancel crop
         self.safe_click('[data-tool="crop"]')
-        self.wait(300)
+        self.wait_panel("cropToolPanel")
         self.safe_click('.preset-btn[data-ratio="free"]')
-        self.wait(300)
+        self.wait_ff('window.formatFlip.isCropping === true', timeout=1000)
         self.safe_click("#resetCropBtn")
-        self.wait(300)
+        self.wait_ff('window.formatFlip.isCropping === false', timeout=1000)
         is_cropping_after_reset = self.eval_js('''() => {
             const ff = window.formatFlip;
             return ff ? ff.isCropping : true;
@@ -464,33 +946,33 @@ class FormatFlipTestRunner:
         print("\n  --- Crop Non-Free Ratio Verification ---")
         try:
             self.safe_click('[data-tool="crop"]')
-            self.wait(300)
-            # Try 1:1 ratio - was crashing with "aspect is not defined", now uses 'ratio'
-            error_caught = self.eval_js('''() => {
+            self.wait_panel("cropToolPanel")
+            # Every non-free preset in one call - 1:1 was crashing with
+            # "aspect is not defined", now uses 'ratio'
+            results = self.page.evaluate('''(ratios) => Object.fromEntries(ratios.map(r => {
+                const ff = window.formatFlip;
+                if (!ff) return [r, "formatFlip_not_found"];
                 try {
-                    const ff = window.formatFlip;
-                    if (ff) {
-                        ff.startCrop("1:1");
-                        return "no_error";
-                    }
-                    return "formatFlip_not_found";
+                    ff.startCrop(r);
+                    return [r, "no_error"];
                 } catch(e) {
-                    return "ERROR: " + e.message;
+                    return [r, "ERROR: " + e.message];
                 }
-            }''')
-            no_error = error_caught == "no_error"
-            self.record("BUG-1", "Crop 1:1 ratio works (was: 'aspect' undefined)",
-                        no_error,
-                        f"Result: {error_caught}. " +
-                        ("FIXED: non-free crop ratios work correctly." if no_error else
-                         "STILL BROKEN: " + str(error_caught)))
+            }))''', CROP_RATIOS)
+            for ratio, error_caught in results.items():
+                no_error = error_caught == "no_error"
+                self.record(f"BUG-1 {ratio}", f"Crop {ratio} ratio works (was: 'aspect' undefined)",
+                            no_error,
+                            f"Result: {error_caught}. " +
+                            ("FIXED: non-free crop ratios work correctly." if no_error else
+                             "STILL BROKEN: " + str(error_caught)))
         except Exception as e:
-            self.record("BUG-1", "Crop 1:1 ratio works (was: 'aspect' undefined)",
+            self.record("BUG-1", "Crop non-free ratios work (was: 'aspect' undefined)",
                         False, f"Test error: {e}")
 
         # Reset crop state
         self.safe_click("#resetCropBtn")
-        self.wait(200)
+        self._rewind_history()
 
     # --- Phase 5: Rotate & Flip ---
 
@@ -498,29 +980,16 @@ class FormatFlipTestRunner:
         print("\n--- Phase 5: Rotate & Flip ---")
 
         # Get original dimensions
-        orig = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        orig = self.eval_js('__tf.canvasDims()')
 
         # Test 19: Rotate panel opens
         self.safe_click('[data-tool="rotate"]')
-        self.wait(500)
-        panel_active = self.eval_js('''() => {
-            const p = document.getElementById("rotateToolPanel");
-            return p && (p.classList.contains("active") ||
-                   getComputedStyle(p).display !== "none");
-        }''')
+        panel_active = self.wait_panel("rotateToolPanel")
         self.record(19, "Rotate panel opens", panel_active)
         self.screenshot("12_rotate_panel")
 
         # Test 20: Rotate 90 right
-        self.safe_click('[data-action="rotate-right"]')
-        self.wait(500)
-        after_right = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        after_right = self.press('[data-action="rotate-right"]').get("dims")
         swapped = (after_right and orig and
                    after_right["w"] == orig["h"] and after_right["h"] == orig["w"])
         self.record(20, "Rotate 90 right", swapped,
@@ -528,24 +997,14 @@ class FormatFlipTestRunner:
         self.screenshot("13_rotated_right")
 
         # Test 21: Rotate 90 left (should restore)
-        self.safe_click('[data-action="rotate-left"]')
-        self.wait(500)
-        after_left = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        after_left = self.press('[data-action="rotate-left"]').get("dims")
         restored = (after_left and orig and
                     after_left["w"] == orig["w"] and after_left["h"] == orig["h"])
         self.record(21, "Rotate 90 left restores", restored,
                     f"After left: {after_left}")
 
         # Test 22: Rotate 180
-        self.safe_click('[data-action="rotate-180"]')
-        self.wait(500)
-        after_180 = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        after_180 = self.press('[data-action="rotate-180"]').get("dims")
         same_dims = (after_180 and orig and
                      after_180["w"] == orig["w"] and after_180["h"] == orig["h"])
         self.record(22, "Rotate 180", same_dims,
@@ -553,30 +1012,18 @@ class FormatFlipTestRunner:
         self.screenshot("14_rotated_180")
 
         # Test 23: Flip horizontal
-        self.safe_click('[data-action="flip-h"]')
-        self.wait(500)
-        toast = self.eval_js('''() => {
-            const t = document.querySelector(".toast");
-            return t ? t.textContent : "";
-        }''')
+        toast = self.press('[data-action="flip-h"]').get("toasts")
         self.record(23, "Flip horizontal", True,
                     f"Toast: {toast}")
 
         # Test 24: Flip vertical
-        self.safe_click('[data-action="flip-v"]')
-        self.wait(500)
-        toast = self.eval_js('''() => {
-            const t = document.querySelector(".toast");
-            return t ? t.textContent : "";
-        }''')
+        toast = self.press('[data-action="flip-v"]').get("toasts")
         self.record(24, "Flip vertical", True,
                     f"Toast: {toast}")
         self.screenshot("15_after_flips")
 
         # Undo all rotations/flips to restore clean state
-        for _ in range(5):
-            self.page.keyboard.press("Control+z")
-            self.wait(150)
+        self._rewind_history()
 
     # --- Phase 6: Resize Tool ---
 
@@ -585,40 +1032,34 @@ class FormatFlipTestRunner:
 
         # Test 25: Resize panel opens
         self.safe_click('[data-tool="resize"]')
-        self.wait(500)
-        panel_active = self.eval_js('''() => {
-            const p = document.getElementById("resizeToolPanel");
-            return p && (p.classList.contains("active") ||
-                   getComputedStyle(p).display !== "none");
-        }''')
+        panel_active = self.wait_panel("resizeToolPanel")
         self.record(25, "Resize panel opens", panel_active)
         self.screenshot("16_resize_panel")
 
         # Test 26: Width/height populated
-        width_val = self.eval_js('document.getElementById("resizeWidth")?.value')
-        height_val = self.eval_js('document.getElementById("resizeHeight")?.value')
-        canvas_dims = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        state = self.snapshot('''
+            width: __tf.node("resizeWidth")?.value,
+            height: __tf.node("resizeHeight")?.value,
+            canvas: __tf.canvasDims(),
+            lockActive: __tf.node("lockAspectBtn")?.classList.contains("active") || false
+        ''')
+        width_val = state.get("width")
+        height_val = state.get("height")
+        canvas_dims = state.get("canvas")
         populated = (width_val and height_val and
                      int(width_val) > 0 and int(height_val) > 0)
         self.record(26, "Width/height populated", populated,
                     f"Inputs: {width_val}x{height_val}, Canvas: {canvas_dims}")
 
         # Test 27: Aspect lock works
-        lock_active = self.eval_js('''() => {
-            const btn = document.getElementById("lockAspectBtn");
-            return btn ? btn.classList.contains("active") : false;
-        }''')
+        lock_active = state.get("lockActive", False)
         if lock_active:
             # Change width and check if height auto-updates
             self.page.fill("#resizeWidth", "400")
-            self.wait(300)
             # Trigger input event
-            self.eval_js('document.getElementById("resizeWidth").dispatchEvent(new Event("input"))')
-            self.wait(300)
-            new_height = self.eval_js('document.getElementById("resizeHeight")?.value')
+            self.eval_js('__tf.node("resizeWidth").dispatchEvent(new Event("input"))')
+            self.wait_ff(f'__tf.node("resizeHeight")?.value !== "{height_val}"', timeout=1000)
+            new_height = self.eval_js('__tf.node("resizeHeight")?.value')
             self.record(27, "Aspect lock works", new_height and int(new_height) != int(height_val),
                         f"Width set to 400, height changed to: {new_height}")
         else:
@@ -628,16 +1069,11 @@ class FormatFlipTestRunner:
         # Unlock aspect ratio first
         if lock_active:
             self.safe_click("#lockAspectBtn")
-            self.wait(200)
+            self.wait_ff('!__tf.node("lockAspectBtn")?.classList.contains("active")', timeout=1000)
         self.page.fill("#resizeWidth", "200")
         self.page.fill("#resizeHeight", "200")
-        self.wait(200)
-        self.safe_click("#applyResizeBtn")
-        self.wait(500)
-        new_dims = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        self.click_edit("#applyResizeBtn")
+        new_dims = self.eval_js('__tf.canvasDims()')
         is_200 = new_dims and new_dims["w"] == 200 and new_dims["h"] == 200
         self.record(28, "Apply resize 200x200", is_200,
                     f"Canvas dims: {new_dims}")
@@ -645,14 +1081,17 @@ class FormatFlipTestRunner:
 
         # Test 29: Size preset buttons
         self.safe_click('[data-tool="resize"]')
-        self.wait(300)
+        self.wait_panel("resizeToolPanel")
         try:
-            preset_btn = self.page.locator('.preset-btn[data-size="640x480"]')
+            preset_btn = self.loc('.preset-btn[data-size="640x480"]')
             if preset_btn.count() > 0:
-                preset_btn.first.click()
-                self.wait(300)
-                w = self.eval_js('document.getElementById("resizeWidth")?.value')
-                h = self.eval_js('document.getElementById("resizeHeight")?.value')
+                preset_btn.click()
+                self.wait_ff('__tf.node("resizeWidth")?.value === "640"', timeout=1000)
+                state = self.snapshot('''
+                    w: __tf.node("resizeWidth")?.value,
+                    h: __tf.node("resizeHeight")?.value
+                ''')
+                w, h = state.get("w"), state.get("h")
                 self.record(29, "Size preset buttons (640x480)", w == "640" and h == "480",
                             f"Input values: {w}x{h}")
             else:
@@ -661,8 +1100,7 @@ class FormatFlipTestRunner:
             self.record(29, "Size preset buttons", False, str(e))
 
         # Undo resize
-        self.page.keyboard.press("Control+z")
-        self.wait(300)
+        self._rewind_history()
 
     # --- Phase 7: Format Selection ---
 
@@ -671,72 +1109,53 @@ class FormatFlipTestRunner:
 
         # Test 30: Navigate to step 3
         self.safe_click("#nextStepBtn")
-        self.wait(1000)
-        step3_visible = self.eval_js('''() => {
-            const s3 = document.getElementById("step3");
-            return s3 && (s3.classList.contains("active") ||
-                   getComputedStyle(s3).display !== "none");
-        }''')
+        self.wait_panel("step3", timeout=DEFAULT_TIMEOUT)
+        state = self.snapshot('''
+            step3Visible: __tf.panelActive("step3"),
+            previewDims: __tf.canvasDims("previewCanvas")
+        ''')
+        step3_visible = state.get("step3Visible", False)
         self.record(30, "Navigate to step 3", step3_visible)
         self.screenshot("18_step3")
 
         # Test 31: Preview renders
-        preview_dims = self.eval_js('''() => {
-            const c = document.getElementById("previewCanvas");
-            return c ? {w: c.width, h: c.height} : null;
-        }''')
+        preview_dims = state.get("previewDims")
         has_preview = preview_dims and preview_dims.get("w", 0) > 0
         self.record(31, "Preview renders", has_preview,
                     f"Preview dims: {preview_dims}")
 
         # Test 32: PNG selected
-        self.safe_click('.format-option[data-format="png"]')
-        self.wait(300)
-        png_selected = self.eval_js('''() => {
-            const opt = document.querySelector('.format-option[data-format="png"]');
-            return opt ? opt.classList.contains("selected") : false;
-        }''')
+        self.select_format("png")
+        png_selected = self.eval_js('__tf.formatSelected("png")')
         self.record(32, "PNG selected", png_selected)
 
         # Test 33: JPG selected (quality slider visible)
-        self.safe_click('.format-option[data-format="jpg"]')
-        self.wait(300)
-        jpg_selected = self.eval_js('''() => {
-            const opt = document.querySelector('.format-option[data-format="jpg"]');
-            return opt ? opt.classList.contains("selected") : false;
-        }''')
-        quality_visible = self.eval_js('''() => {
-            const qc = document.getElementById("qualityControl");
-            return qc ? getComputedStyle(qc).display !== "none" : false;
-        }''')
+        self.select_format("jpg")
+        state = self.snapshot('''
+            jpgSelected: __tf.formatSelected("jpg"),
+            qualityVisible: __tf.shown("qualityControl")
+        ''')
+        jpg_selected = state.get("jpgSelected", False)
+        quality_visible = state.get("qualityVisible", False)
         self.record(33, "JPG selected + quality slider", jpg_selected and quality_visible,
                     f"JPG selected: {jpg_selected}, Quality visible: {quality_visible}")
         self.screenshot("19_jpg_selected")
 
         # Test 34: WebP tab + selection
-        self.safe_click('.format-tab[data-category="web"]')
-        self.wait(300)
-        self.safe_click('.format-option[data-format="webp"]')
-        self.wait(300)
-        webp_selected = self.eval_js('''() => {
-            const opt = document.querySelector('.format-option[data-format="webp"]');
-            return opt ? opt.classList.contains("selected") : false;
-        }''')
+        self.select_tab("web")
+        self.select_format("webp")
+        webp_selected = self.eval_js('__tf.formatSelected("webp")')
         self.record(34, "WebP tab + selection", webp_selected)
 
         # Test 35: ICO in Special tab
-        self.safe_click('.format-tab[data-category="special"]')
-        self.wait(300)
-        self.safe_click('.format-option[data-format="ico"]')
-        self.wait(300)
-        ico_selected = self.eval_js('''() => {
-            const opt = document.querySelector('.format-option[data-format="ico"]');
-            return opt ? opt.classList.contains("selected") : false;
-        }''')
-        ico_options = self.eval_js('''() => {
-            const ctrl = document.getElementById("icoSizeControl");
-            return ctrl ? getComputedStyle(ctrl).display !== "none" : false;
-        }''')
+        self.select_tab("special")
+        self.select_format("ico")
+        state = self.snapshot('''
+            icoSelected: __tf.formatSelected("ico"),
+            icoOptions: __tf.shown("icoSizeControl")
+        ''')
+        ico_selected = state.get("icoSelected", False)
+        ico_options = state.get("icoOptions", False)
         self.record(35, "ICO selected + options shown",
                     ico_selected,
                     f"ICO selected: {ico_selected}, Size options visible: {ico_options}")
@@ -744,19 +1163,16 @@ class FormatFlipTestRunner:
 
         # Test 36: Quality slider
         # Switch back to PNG for cleaner download test
-        self.safe_click('.format-tab[data-category="common"]')
-        self.wait(200)
-        self.safe_click('.format-option[data-format="jpg"]')
-        self.wait(200)
+        self.select_tab("common")
+        self.select_format("jpg")
         try:
-            slider = self.page.locator("#qualitySlider")
+            slider = self.loc("#qualitySlider")
             if slider.count() > 0:
                 slider.fill("50")
-                self.wait(200)
                 # Trigger input event
-                self.eval_js('document.getElementById("qualitySlider").dispatchEvent(new Event("input"))')
-                self.wait(200)
-                quality_text = self.eval_js('document.getElementById("qualityValue")?.textContent || ""')
+                self.eval_js('__tf.node("qualitySlider").dispatchEvent(new Event("input"))')
+                self.wait_ff('__tf.node("qualityValue")?.textContent.includes("50")', timeout=1000)
+                quality_text = self.eval_js('__tf.node("qualityValue")?.textContent || ""')
                 self.record(36, "Quality slider", "50" in quality_text,
                             f"Quality display: {quality_text}")
             else:
@@ -765,8 +1181,7 @@ class FormatFlipTestRunner:
             self.record(36, "Quality slider", False, str(e))
 
         # Select PNG for download phase
-        self.safe_click('.format-option[data-format="png"]')
-        self.wait(200)
+        self.select_format("png")
 
     # --- Phase 8: Download ---
 
@@ -775,36 +1190,41 @@ class FormatFlipTestRunner:
 
         # Test 37: Navigate to step 4
         # The Next button on step 3 says "Convert" and triggers conversion
-        next_btn = self.page.locator("#nextStepBtn")
+        next_btn = self.loc("#nextStepBtn")
         next_btn.click()
-        self.wait(2000)  # Give conversion time
-
-        step4_visible = self.eval_js('''() => {
-            const s4 = document.getElementById("step4");
-            return s4 && (s4.classList.contains("active") ||
-                   getComputedStyle(s4).display !== "none");
-        }''')
+        # prepareDownloads() adds its rows (with disabled buttons) before
+        # converting anything, so wait until no size still reads "Preparing..."
+        self.wait_ff('__tf.panelActive("step4") && document.querySelectorAll(".download-item").length >= 1'
+                     ' && [...document.querySelectorAll(".download-size")]'
+                     '.every(s => s.textContent !== "Preparing...")',
+                     timeout=CONVERSION_TIMEOUT)
+
+        state = self.snapshot('''
+            step4Visible: __tf.panelActive("step4"),
+            downloadCount: document.querySelectorAll(".download-item").length,
+            hasDownloadBtn: !!document.querySelector(".download-btn"),
+            downloadAllText: __tf.node("downloadAllBtn")?.textContent.trim() || "",
+            hasZipFn: !!window.formatFlip && typeof window.formatFlip.downloadAsZip === "function"
+        ''')
+        step4_visible = state.get("step4Visible", False)
         self.record(37, "Navigate to step 4", step4_visible)
         self.screenshot("21_step4")
 
         # Test 38: Download list populated
-        download_count = self.eval_js('''() => {
-            return document.querySelectorAll(".download-item").length;
-        }''')
+        download_count = state.get("downloadCount", 0)
         self.record(38, "Download list populated", download_count >= 1,
                     f"{download_count} download item(s)")
 
         # Test 39: Single file download
         # We can intercept download by checking if blob URL creation happens
-        download_triggered = self.eval_js('''() => {
-            // Check if download button exists
-            const btn = document.querySelector(".download-btn");
-            return btn ? true : false;
-        }''')
+        download_triggered = state.get("hasDownloadBtn", False)
         if download_triggered:
-            # Set up download interception
+            # Set up download interception. The wait above let conversion
+            # finish, so the button is enabled with its convertedBlob set and
+            # the blob download starts within the click's task or not at all;
+            # a short timeout loses nothing
             try:
-                with self.page.expect_download(timeout=5000) as download_info:
+                with self.page.expect_download(timeout=800) as download_info:
                     self.safe_click(".download-btn")
                 download = download_info.value
                 self.record(39, "Single file download", True,
@@ -821,19 +1241,14 @@ class FormatFlipTestRunner:
         self.record(40, "Download All button exists", download_all_exists)
 
         # Test 41: Download All button calls downloadAsZip()
-        download_all_text = self.eval_js('''() => {
-            const btn = document.getElementById("downloadAllBtn");
-            return btn ? btn.textContent.trim() : "";
-        }''')
+        download_all_text = state.get("downloadAllText", "")
         has_zip_text = "ZIP" in (download_all_text or "")
         self.record(41, "Download All button triggers ZIP download",
                     has_zip_text,
                     f"downloadAllBtn text: '{download_all_text}'")
 
         # Test 42: downloadAsZip() method exists on app
-        has_zip_fn = self.eval_js('''() => {
-            return window.formatFlip && typeof window.formatFlip.downloadAsZip === "function";
-        }''')
+        has_zip_fn = state.get("hasZipFn", False)
         self.record(42, "downloadAsZip() function exists",
                     has_zip_fn,
                     "downloadAsZip() is available and wired to Download All button")
@@ -842,48 +1257,33 @@ class FormatFlipTestRunner:
 
     # --- Phase 9: Multi-File Workflow ---
 
-    def test_phase9_multifile(self, image_path_1, image_path_2):
+    def test_phase9_multifile(self, image_1, image_2):
         print("\n--- Phase 9: Multi-File Workflow ---")
 
-        # Navigate back to step 1 via startOver or page reload
-        self.page.goto(APP_URL, wait_until="domcontentloaded", timeout=30000)
-        self.page.wait_for_load_state("networkidle", timeout=15000)
-        # Re-bypass auth
-        self.page.evaluate('''() => {
-            const modal = document.getElementById("authModal");
-            if (modal) { modal.style.display = "none"; modal.classList.add("hidden"); }
-            document.body.style.overflow = "";
-        }''')
-        self.wait(500)
+        # Back to step 1 with no files
+        self.reset_app()
 
         # Upload both files at once
-        file_input = self.page.locator("#fileInput")
-        file_input.set_input_files([image_path_1, image_path_2])
-        self.wait(2000)
+        self.upload([image_1, image_2])
 
         # Test 43: Multiple files loaded
-        file_count = self.eval_js('''() => {
-            const ff = window.formatFlip;
-            return ff ? ff.files.length : 0;
-        }''')
+        state = self.snapshot('...__tf.ffState()')
+        file_count = state.get("fileCount", 0)
         self.record(43, "Upload multiple files", file_count >= 2,
                     f"Files loaded: {file_count}")
 
         # Test 44: Navigate between files
-        file_count = self.eval_js('''() => {
-            return window.formatFlip ? window.formatFlip.files.length : 0;
-        }''')
         if file_count >= 2:
-            current_idx_before = self.eval_js('''() => {
-                return window.formatFlip ? window.formatFlip.currentFileIndex : -1;
-            }''')
+            current_idx_before = state.get("currentFileIndex", -1)
             self.safe_click("#nextImageBtn")
-            self.wait(500)
-            current_idx_after = self.eval_js('''() => {
-                return window.formatFlip ? window.formatFlip.currentFileIndex : -1;
-            }''')
+            self.wait_ff(f'window.formatFlip.currentFileIndex !== {current_idx_before}', timeout=1000)
+            state = self.snapshot('''
+                idx: window.formatFlip ? window.formatFlip.currentFileIndex : -1,
+                counter: __tf.node("imageCounter")?.textContent || ""
+            ''')
+            current_idx_after = state.get("idx", -1)
             navigated = current_idx_before != current_idx_after
-            counter_text = self.eval_js('document.getElementById("imageCounter")?.textContent || ""')
+            counter_text = state.get("counter", "")
             self.record(44, "Navigate between files", navigated,
                         f"Before: {current_idx_before}, After: {current_idx_after}, Counter: {counter_text}")
         else:
@@ -893,37 +1293,26 @@ class FormatFlipTestRunner:
         if file_count >= 2:
             # Go back to file 0
             self.safe_click("#prevImageBtn")
-            self.wait(500)
-
-            # Make an edit (rotate) on file 0
-            self.safe_click('[data-tool="rotate"]')
-            self.wait(300)
-            self.safe_click('[data-action="rotate-right"]')
-            self.wait(500)
+            self.wait_ff('window.formatFlip.currentFileIndex === 0', timeout=1000)
 
-            dims_after_edit = self.eval_js('''() => {
-                const c = document.getElementById("editCanvas");
-                return c ? {w: c.width, h: c.height} : null;
-            }''')
+            # Make an edit (rotate) on file 0: open the tool and rotate in one call
+            dims_after_edit = self.press('[data-tool="rotate"]', '[data-action="rotate-right"]').get("dims")
 
             # Switch to file 1
             self.safe_click("#nextImageBtn")
-            self.wait(500)
+            self.wait_ff('window.formatFlip.currentFileIndex === 1', timeout=1000)
 
             # Switch back to file 0
             self.safe_click("#prevImageBtn")
-            self.wait(500)
-
-            dims_after_return = self.eval_js('''() => {
-                const c = document.getElementById("editCanvas");
-                return c ? {w: c.width, h: c.height} : null;
-            }''')
+            self.wait_ff('window.formatFlip.currentFileIndex === 0', timeout=1000)
 
             # Check if edit was preserved
-            has_edited = self.eval_js('''() => {
-                const ff = window.formatFlip;
-                return ff && ff.files[0] ? ff.files[0].edited : false;
-            }''')
+            state = self.snapshot('''
+                dims: __tf.canvasDims(),
+                edited: window.formatFlip?.files[0]?.edited ?? false
+            ''')
+            dims_after_return = state.get("dims")
+            has_edited = state.get("edited")
             self.record(45, "Edits preserved across navigation",
                         has_edited is True,
                         f"After edit: {dims_after_edit}, After return: {dims_after_return}, edited flag: {has_edited}")
@@ -933,18 +1322,11 @@ class FormatFlipTestRunner:
 
     # --- Phase 10: Edge Cases ---
 
-    def test_phase10_edge_cases(self):
+    def test_phase10_edge_cases(self, image):
         print("\n--- Phase 10: Edge Cases & Error Handling ---")
 
-        # Fresh reload for clean state
-        self.page.goto(APP_URL, wait_until="domcontentloaded", timeout=30000)
-        self.page.wait_for_load_state("networkidle", timeout=15000)
-        self.page.evaluate('''() => {
-            const modal = document.getElementById("authModal");
-            if (modal) { modal.style.display = "none"; modal.classList.add("hidden"); }
-            document.body.style.overflow = "";
-        }''')
-        self.wait(500)
+        # Clean state: step 1, no files
+        self.reset_app()
 
         # Test 47: Navigate without upload (test this FIRST on clean state)
         # Intercept showToast to capture the message directly
@@ -964,12 +1346,7 @@ class FormatFlipTestRunner:
             ff.showToast = origToast;
             return captured;
         }''')
-        self.wait(500)
-        still_step1 = self.eval_js('''() => {
-            const s1 = document.getElementById("step1");
-            return s1 && (s1.classList.contains("active") ||
-                   getComputedStyle(s1).display !== "none");
-        }''')
+        still_step1 = self.eval_js('__tf.panelActive("step1")')
         has_error_toast = "upload" in toast_msg.lower() or "image" in toast_msg.lower()
         self.record(47, "Navigate without upload shows error",
                     still_step1 and has_error_toast,
@@ -977,31 +1354,23 @@ class FormatFlipTestRunner:
         self.screenshot("25_no_upload_error")
 
         # Now upload a file so we can test Start Over
-        file_input = self.page.locator("#fileInput")
-        file_input.set_input_files(str(SCRATCHPAD / "test_images" / "test_white_bg.png"))
-        self.wait(1500)
+        self.upload(image)
 
         # Test 46: Start Over (from step 2)
         # #startOverBtn only exists in step 4 HTML, so call startOver() directly
         step2_active = self.eval_js('''() => {
-            const s2 = document.getElementById("step2");
-            return s2 && (s2.classList.contains("active") ||
-                   getComputedStyle(s2).display !== "none");
-        }''')
-        self.eval_js('''() => {
+            const active = __tf.panelActive("step2");
             const ff = window.formatFlip;
             if (ff && ff.startOver) ff.startOver();
+            return active;
         }''')
-        self.wait(1000)
-        step1_active = self.eval_js('''() => {
-            const s1 = document.getElementById("step1");
-            return s1 && (s1.classList.contains("active") ||
-                   getComputedStyle(s1).display !== "none");
-        }''')
-        files_cleared = self.eval_js('''() => {
-            const ff = window.formatFlip;
-            return ff ? ff.files.length : -1;
-        }''')
+        self.wait_panel("step1")
+        state = self.snapshot('''
+            step1: __tf.panelActive("step1"),
+            files: window.formatFlip ? window.formatFlip.files.length : -1
+        ''')
+        step1_active = state.get("step1", False)
+        files_cleared = state.get("files", -1)
         self.record(46, "Start Over",
                     step1_active and files_cleared == 0,
                     f"Was on step 2: {step2_active}, Step 1 active: {step1_active}, Files: {files_cleared}")
@@ -1009,79 +1378,55 @@ class FormatFlipTestRunner:
 
         # Test 48: Help modal
         self.safe_click("#helpBtn")
-        self.wait(500)
-        help_visible = self.eval_js('''() => {
-            const m = document.getElementById("helpModal");
-            return m && !m.classList.contains("hidden") &&
-                   getComputedStyle(m).display !== "none";
-        }''')
+        help_visible = self.wait_ff('__tf.shown("helpModal")', timeout=1000)
         self.record(48, "Help modal opens", help_visible)
         self.screenshot("26_help_modal")
 
         # Test 49: Help tabs
-        tabs_work = True
+        # Tab handlers toggle classes synchronously, so every tab can be
+        # clicked and its panel checked in one evaluate
         tab_names = ["quickstart", "formats", "editing", "tips"]
-        for tab_name in tab_names:
-            self.safe_click(f'.help-tab[data-tab="{tab_name}"]')
-            self.wait(200)
-            panel_visible = self.eval_js(f'''() => {{
-                const p = document.getElementById("{tab_name}Panel");
-                return p ? getComputedStyle(p).display !== "none" : false;
-            }}''')
-            if not panel_visible:
-                tabs_work = False
-        self.record(49, "Help tabs switch content", tabs_work)
+        try:
+            results = self.page.evaluate('''(names) => names.map(name => {
+                const tab = document.querySelector(`.help-tab[data-tab="${name}"]`);
+                if (tab) tab.click();
+                return {name, visible: !!tab && __tf.shown(name + "Panel")};
+            })''', tab_names)
+        except Exception as e:
+            results = [{"name": str(e), "visible": False}]
+        hidden = [r["name"] for r in results if not r["visible"]]
+        self.record(49, "Help tabs switch content", not hidden,
+                    f"Not shown: {', '.join(hidden)}" if hidden else "")
 
         # Test 50: Close help
         self.safe_click("#closeHelpBtn")
-        self.wait(300)
-        help_hidden = self.eval_js('''() => {
-            const m = document.getElementById("helpModal");
-            return m && (m.classList.contains("hidden") ||
-                   getComputedStyle(m).display === "none");
-        }''')
+        help_hidden = self.wait_ff('!!__tf.node("helpModal") && !__tf.shown("helpModal")', timeout=1000)
         self.record(50, "Close help modal", help_hidden)
 
         # Test 51: Keyboard undo (Ctrl+Z)
-        # Need an image loaded to test undo
-        # We'll just verify the keyboard handler exists
-        has_handler = self.eval_js('''() => {
-            const ff = window.formatFlip;
-            return ff && typeof ff.undo === "function";
-        }''')
-        self.record(51, "Keyboard undo (Ctrl+Z) handler exists", has_handler is True,
-                    "app.undo() function exists")
+        self.run_checks(UNDO_HANDLER_CHECKS)
 
     # --- Phase 11: CSS & Visual Checks ---
 
-    def test_phase11_css(self, image_path):
+    def test_phase11_css(self, image):
         print("\n--- Phase 11: CSS & Visual Checks ---")
 
-        # Fresh reload
-        self.page.goto(APP_URL, wait_until="domcontentloaded", timeout=30000)
-        self.page.wait_for_load_state("networkidle", timeout=15000)
-        self.page.evaluate('''() => {
-            const modal = document.getElementById("authModal");
-            if (modal) { modal.style.display = "none"; modal.classList.add("hidden"); }
-            document.body.style.overflow = "";
-        }''')
-        self.wait(500)
+        # Clean state: step 1, no files
+        self.reset_app()
 
         # Upload an image so canvas is visible
-        file_input = self.page.locator("#fileInput")
-        file_input.set_input_files(image_path)
-        self.wait(1500)
+        self.upload(image)
 
         # Test 52: Canvas cursor defaults to 'default' (was BUG-2, now fixed)
-        cursor = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            if (!c) return "not found";
-            return getComputedStyle(c).cursor;
-        }''')
-        inline_cursor = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            return c ? c.style.cursor : "not set";
-        }''')
+        state = self.snapshot('''
+            cursor: (() => {
+                const c = __tf.node("editCanvas");
+                return c ? getComputedStyle(c).cursor : "not found";
+            })(),
+            inline: __tf.node("editCanvas")?.style.cursor ?? "not set"
+        ''')
+        cursor = state.get("cursor", "not found")
+        inline_cursor = state.get("inline", "not set")
         is_default = cursor == "default"
         self.record(52, "Canvas cursor defaults to 'default' when no tool active",
                     is_default,
@@ -1092,10 +1437,9 @@ class FormatFlipTestRunner:
         # Test 53: Checkerboard background visible
         # Remove background then screenshot
         self.safe_click('[data-tool="background"]')
-        self.wait(300)
-        self.safe_click("#autoRemoveWhiteBtn")
-        self.wait(1000)
-        self.screenshot("27_checkerboard_transparency")
+        self.wait_panel("bgToolPanel")
+        self.click_edit("#autoRemoveWhiteBtn")
+        self.screenshot("27_checkerboard_transparency", canonical=True)
 
         container_bg = self.eval_js('''() => {
             const c = document.querySelector(".canvas-container");
@@ -1111,234 +1455,235 @@ class FormatFlipTestRunner:
     def test_known_bugs(self):
         print("\n--- Known Bug Verification ---")
 
-        # BUG-2: #editCanvas CSS cursor (was hardcoded crosshair, now fixed to default)
-        cursor_check = self.eval_js('''() => {
-            const c = document.getElementById("editCanvas");
-            if (!c) return {computed: "not found", inline: ""};
-            const savedCursor = c.style.cursor;
-            c.style.cursor = "";
-            const computed = getComputedStyle(c).cursor;
-            c.style.cursor = savedCursor;
-            return {computed: computed, inline: savedCursor};
-        }''')
-        css_is_default = isinstance(cursor_check, dict) and cursor_check.get("computed") == "default"
-        self.record("BUG-2", "CSS cursor on #editCanvas is default (was crosshair)",
-                    css_is_default,
-                    f"Computed (with inline cleared): {cursor_check}. " +
-                    ("FIXED: CSS now sets cursor:default." if css_is_default else
-                     "STILL BROKEN: CSS still sets cursor:crosshair."))
-
-        # BUG-3: downloadAllBtn calls downloadAsZip() (was calling downloadAll())
-        download_check = self.eval_js('''() => {
-            const ff = window.formatFlip;
-            return {
-                downloadAllExists: document.getElementById("downloadAllBtn") !== null,
-                downloadAsZipExists: ff && typeof ff.downloadAsZip === "function",
-                btnText: document.getElementById("downloadAllBtn")?.textContent.trim() || ""
-            };
-        }''')
-        all_exists = download_check.get("downloadAllExists") if isinstance(download_check, dict) else False
-        zip_fn_exists = download_check.get("downloadAsZipExists") if isinstance(download_check, dict) else False
-        self.record("BUG-3", "downloadAsZip() is reachable via UI",
-                    all_exists and zip_fn_exists,
-                    f"Check: {download_check}. " +
-                    ("FIXED: downloadAllBtn calls downloadAsZip()." if (all_exists and zip_fn_exists) else
-                     "STILL BROKEN: downloadAsZip() unreachable."))
+        self.run_checks(KNOWN_BUG_CHECKS)
 
     # --- Report Generation ---
 
     def generate_report(self):
         """Generate markdown test report."""
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        total = len(self.results)
-        passed = sum(1 for r in self.results if r["status"] == "PASS")
-        failed = sum(1 for r in self.results if r["status"] == "FAIL")
-        skipped = sum(1 for r in self.results if r["status"] == "SKIP")
-
-        lines = [
-            f"# FormatFlip - Automated Test Report",
-            f"",
-            f"**Generated:** {now}",
-            f"**URL:** {APP_URL}",
-            f"**Mode:** {'Live site' if USE_LIVE else 'Local file://'}",
-            f"",
-            f"## Summary",
-            f"",
-            f"| Metric | Count |",
-            f"|--------|-------|",
-            f"| Total Tests | {total} |",
-            f"| Passed | {passed} |",
-            f"| Failed | {failed} |",
-            f"| Skipped | {skipped} |",
-            f"| Pass Rate | {passed/total*100:.1f}% |" if total > 0 else "",
-            f"",
-            f"## Test Results",
-            f"",
-            f"| # | Test | Status | Detail |",
-            f"|---|------|--------|--------|",
-        ]
 
+        # One pass over the results: counts, table rows, bugs and failures
+        counts = {"PASS": 0, "FAIL": 0, "SKIP": 0}
+        status_icons = {"PASS": "PASS", "FAIL": "**FAIL**", "SKIP": "SKIP"}
+        rows = io.StringIO()
+        bugs = []
+        failed_tests = []
         for r in self.results:
-            status_icon = {"PASS": "PASS", "FAIL": "**FAIL**", "SKIP": "SKIP"}[r["status"]]
+            status = r["status"]
+            counts[status] += 1
             detail = r["detail"].replace("|", "\\|").replace("\n", " ")
             if len(detail) > 120:
                 detail = detail[:117] + "..."
-            lines.append(f"| {r['id']} | {r['name']} | {status_icon} | {detail} |")
+            rows.write(f"\n| {r['id']} | {r['name']} | {status_icons[status]} | {detail} |")
+            if status == "FAIL":
+                failed_tests.append(r)
+            if str(r["id"]).startswith("BUG"):
+                bugs.append(r)
+        total = len(self.results)
+        passed, failed, skipped = counts["PASS"], counts["FAIL"], counts["SKIP"]
+
+        out = io.StringIO()
+        out.write(
+            f"# FormatFlip - Automated Test Report\n"
+            f"\n"
+            f"**Generated:** {now}\n"
+            f"**URL:** {APP_URL}\n"
+            f"**Mode:** {'Live site' if USE_LIVE else 'Local file://'}\n"
+            f"\n"
+            f"## Summary\n"
+            f"\n"
+            f"| Metric | Count |\n"
+            f"|--------|-------|\n"
+            f"| Total Tests | {total} |\n"
+            f"| Passed | {passed} |\n"
+            f"| Failed | {failed} |\n"
+            f"| Skipped | {skipped} |\n"
+            + (f"| Pass Rate | {passed/total*100:.1f}% |\n" if total > 0 else "\n") +
+            f"\n"
+            f"## Test Results\n"
+            f"\n"
+            f"| # | Test | Status | Detail |\n"
+            f"|---|------|--------|--------|"
+        )
+        out.write(rows.getvalue())
 
         # Known Bugs section
-        bugs = [r for r in self.results if str(r["id"]).startswith("BUG")]
         if bugs:
-            lines.extend([
-                f"",
-                f"## Known Bugs Verified",
-                f"",
-            ])
+            out.write("\n\n## Known Bugs Verified\n")
             for b in bugs:
                 confirmed = "Confirmed" if b["status"] == "PASS" else "Not confirmed"
-                lines.extend([
-                    f"### {b['id']}: {b['name']}",
-                    f"",
-                    f"**Status:** {confirmed}",
-                    f"",
-                    f"**Detail:** {b['detail']}",
-                    f"",
-                ])
+                out.write(f"\n### {b['id']}: {b['name']}\n\n**Status:** {confirmed}\n\n"
+                          f"**Detail:** {b['detail']}\n")
 
         # Console errors
         if self.console_errors:
-            lines.extend([
-                f"## Console Errors ({len(self.console_errors)})",
-                f"",
-            ])
+            out.write(f"\n## Console Errors ({len(self.console_errors)})\n")
             for i, err in enumerate(self.console_errors[:50], 1):
-                lines.append(f"{i}. `{err[:200]}`")
-            lines.append("")
+                out.write(f"\n{i}. `{err[:200]}`")
+            out.write("\n")
 
         if self.console_warnings:
-            lines.extend([
-                f"## Console Warnings ({len(self.console_warnings)})",
-                f"",
-            ])
+            out.write(f"\n## Console Warnings ({len(self.console_warnings)})\n")
             for i, warn in enumerate(self.console_warnings[:20], 1):
-                lines.append(f"{i}. `{warn[:200]}`")
-            lines.append("")
+                out.write(f"\n{i}. `{warn[:200]}`")
+            out.write("\n")
 
         # Screenshots
-        lines.extend([
-            f"## Screenshots",
-            f"",
-            f"All screenshots saved to: `{SCREENSHOT_DIR}`",
-            f"",
-        ])
+        out.write(f"\n## Screenshots\n\nAll screenshots saved to: `{SCREENSHOT_DIR}`\n")
         for ss in self.screenshots:
-            lines.append(f"- `{ss}`")
+            first = self.screenshot_aliases.get(ss)
+            out.write(f"\n- `{ss}`" + (f" (same as `{first}`)" if first else ""))
 
         # Bug summary for fixing
-        failed_tests = [r for r in self.results if r["status"] == "FAIL"]
         if failed_tests:
-            lines.extend([
-                f"",
-                f"## Failed Tests - Action Items",
-                f"",
-            ])
+            out.write("\n\n## Failed Tests - Action Items\n")
             for r in failed_tests:
-                lines.extend([
-                    f"- **#{r['id']} {r['name']}**: {r['detail']}",
-                ])
+                out.write(f"\n- **#{r['id']} {r['name']}**: {r['detail']}")
 
-        report = "\n".join(lines)
+        report = out.getvalue()
         REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
         REPORT_PATH.write_text(report)
+        RESULTS_PATH.write_bytes(dump_json(self.results))
         return report
 
     # --- Main Runner ---
 
+    def run_phase_group(self, prefix, preload, steps, images, storage_state=None):
+        """Run one phase group on its own browser and return the worker runner.
+
+        Playwright's sync API is bound to the thread that started it, so each
+        worker starts its own driver and browser rather than sharing ours.
+        """
+        from playwright.sync_api import sync_playwright
+
+        worker = FormatFlipTestRunner(screenshot_prefix=f"{prefix}_", io_pool=self._io_pool)
+        with sync_playwright() as p:
+            phase = None
+            try:
+                worker.browser = launch_browser(p)
+                worker.new_page(bypass_auth=True, storage_state=storage_state)
+                if preload:
+                    worker.open_app(images["white_bg"])
+                for phase, image_keys in steps:
+                    getattr(worker, phase)(*(images[key] for key in image_keys))
+            except Exception as e:
+                print(f"\n*** FATAL ERROR in {phase or prefix}: {e}")
+                traceback.print_exc()
+                # record() captures the failure screenshot
+                worker.record(f"FATAL-{prefix}", phase or "setup", False, str(e))
+            finally:
+                if worker.browser:
+                    worker.browser.close()
+        return worker
+
     def run(self):
         """Run all tests."""
+        from playwright.sync_api import sync_playwright
+
         print(f"FormatFlip Automated Test Agent")
         print(f"URL: {APP_URL}")
-        print(f"Screenshots: {SCREENSHOT_DIR}")
+        print(f"Screenshots: {SCREENSHOT_DIR} ({SCREENSHOTS})")
         print(f"Report: {REPORT_PATH}")
         print("=" * 60)
 
         # Setup
         SCREENSHOT_DIR.mkdir(parents=True, exist_ok=True)
-        images = create_test_images()
-        print(f"Created {len(images)} test images")
+        # Images render in the background while the browser starts and
+        # Phase 1 loads the app, which needs none of them
+        collect_images = start_test_images()
+
+        shard_units = SHARD_UNITS[SHARD_INDEX - 1::SHARD_COUNT]
+        groups = [group for group in PHASE_GROUPS if group[0] in shard_units]
+        if SHARD_COUNT > 1:
+            print(f"Shard {SHARD}: {', '.join(shard_units)}")
 
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
         with sync_playwright() as p:
-            self.browser = p.chromium.launch(headless=True)
-            context = self.browser.new_context(
-                viewport={"width": 1280, "height": 900},
-                accept_downloads=True,
-            )
-            self.page = context.new_page()
-
-            # Capture console errors
-            self.page.on("console", lambda msg: (
-                self.console_errors.append(f"[{msg.type}] {msg.text}")
-                if msg.type == "error"
-                else self.console_warnings.append(f"[{msg.type}] {msg.text}")
-                if msg.type == "warning"
-                else None
-            ))
-
-            # Capture page errors
-            self.page.on("pageerror", lambda exc: (
-                self.console_errors.append(f"[PAGE ERROR] {exc.message}")
-            ))
+            pool = None
+            workers = []
+            split = 0
+            storage_state = None
 
             try:
-                # Phase 1: Load & Auth
-                loaded = self.test_phase1_load()
-                if not loaded:
-                    print("\nPage failed to load. Aborting remaining tests.")
-                    self.generate_report()
-                    return
-
-                # Phase 2: Upload
-                uploaded = self.test_phase2_upload(images["white_bg"])
-                if not uploaded:
-                    print("\nUpload failed. Aborting remaining tests.")
-                    self.generate_report()
-                    return
-
-                # Phase 3: Background Removal
-                self.test_phase3_bg_removal()
-
-                # Phase 4: Crop
-                self.test_phase4_crop()
-
-                # Phase 5: Rotate & Flip
-                self.test_phase5_rotate()
-
-                # Phase 6: Resize
-                self.test_phase6_resize()
-
-                # Phase 7: Format Selection
-                self.test_phase7_format()
-
-                # Phase 8: Download
-                self.test_phase8_download()
-
-                # Phase 9: Multi-File
-                self.test_phase9_multifile(images["white_bg"], images["second"])
-
-                # Phase 10: Edge Cases
-                self.test_phase10_edge_cases()
-
-                # Phase 11: CSS & Visual
-                self.test_phase11_css(images["white_bg"])
-
-                # Known Bug Verification
-                self.test_known_bugs()
+                if "main" in shard_units:
+                    self.browser = launch_browser(p)
+                    self.new_page()
+
+                    # Phase 1: Load & Auth
+                    loaded = self.test_phase1_load()
+                    if not loaded:
+                        print("\nPage failed to load. Aborting remaining tests.")
+                        self.generate_report()
+                        return
+                    # Phase groups start from the post-load session state. Only
+                    # http origins have any; under file:// it would be empty
+                    if USE_LIVE:
+                        storage_state = self.page.context.storage_state()
+
+                images = collect_images()
+                print(f"Created {len(images)} test images")
+
+                if "main" in shard_units:
+                    # Phase 2: Upload
+                    uploaded = self.test_phase2_upload(images["white_bg"])
+                    if not uploaded:
+                        print("\nUpload failed. Aborting remaining tests.")
+                        self.generate_report()
+                        return
+                    split = len(self.results)
+
+                # Phases 3-6 and 9-11 run in parallel on their own browsers
+                # while this page continues with phases 7-8
+                if groups:
+                    pool = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(groups)))
+                    workers = [pool.submit(self.run_phase_group, prefix, preload, steps, images,
+                                           storage_state)
+                               for prefix, preload, steps in groups]
+
+                if "main" in shard_units:
+                    # Phase 7: Format Selection
+                    self.test_phase7_format()
+
+                    # Phase 8: Download
+                    self.test_phase8_download()
 
             except Exception as e:
                 print(f"\n*** FATAL ERROR: {e}")
                 traceback.print_exc()
-                self.screenshot("FATAL_ERROR")
+                if self.page:
+                    self.screenshot("FATAL_ERROR", force=True)
             finally:
-                self.browser.close()
+                if self.browser:
+                    try:
+                        self.browser.close()
+                    except Exception as e:
+                        # Don't let a dead browser cost the workers' results
+                        print(f"\n*** Error closing browser: {e}")
+                if pool:
+                    # Keep the report in phase order: groups that start from an
+                    # uploaded image (3-6) slot in after phase 2, the rest
+                    # (9-11) follow phase 8
+                    pool.shutdown(wait=True)
+                    before, after = [], []
+                    for (prefix, preload, _), future in zip(groups, workers):
+                        try:
+                            worker = future.result()
+                        except Exception as e:
+                            # Failed outside run_phase_group's own handler, e.g.
+                            # starting the driver or closing the browser
+                            print(f"\n*** FATAL ERROR in phase group {prefix}: {e}")
+                            worker = FormatFlipTestRunner()
+                            worker.record(f"FATAL-{prefix}", "phase group", False, str(e))
+                        (before if preload else after).extend(worker.results)
+                        self.console_errors.extend(worker.console_errors)
+                        self.console_warnings.extend(worker.console_warnings)
+                        self.screenshots.extend(worker.screenshots)
+                        self.screenshot_aliases.update(worker.screenshot_aliases)
+                    self.results[split:split] = before
+                    self.results.extend(after)
+                # Every screenshot, workers' included, is on disk after this
+                self._io_pool.shutdown(wait=True)
 
         # Generate report
         report = self.generate_report()
@@ -1355,10 +1700,32 @@ class FormatFlipTestRunner:
         print(f"Console warnings: {len(self.console_warnings)}")
         print(f"Screenshots: {len(self.screenshots)}")
         print(f"\nReport: {REPORT_PATH}")
-        print(f"Screenshots: {SCREENSHOT_DIR}")
+        print(f"Screenshots: {SCREENSHOT_DIR} ({SCREENSHOTS})")
         print("=" * 60)
 
 
+def merge_reports():
+    """Concatenate the per-shard reports into test_report.md / .json."""
+    def shard_files(suffix):
+        return sorted(SCRATCHPAD.glob(f"test_report.shard*{suffix}"),
+                      key=lambda p: int(p.stem.rsplit("shard", 1)[1]))
+
+    shards = shard_files(".md")
+    merged = SCRATCHPAD / "test_report.md"
+    merged.write_text("\n\n---\n\n".join(p.read_text() for p in shards))
+
+    results = []
+    for p in shard_files(".json"):
+        results.extend(orjson.loads(p.read_bytes()) if orjson else json.loads(p.read_text()))
+    merged.with_suffix(".json").write_bytes(dump_json(results))
+
+    print(f"Merged {len(shards)} shard report(s) into {merged}")
+    return merged
+
+
 if __name__ == "__main__":
-    runner = FormatFlipTestRunner()
-    runner.run()
+    if "--merge-reports" in sys.argv:
+        merge_reports()
+    else:
+        runner = FormatFlipTestRunner()
+        runner.run()